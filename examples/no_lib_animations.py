@@ -3,12 +3,48 @@ import time
 from bleak import BleakClient
 import colorsys
 
+# numpy is optional: it only speeds up building the color wheel below
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 address = "FF:FF:22:00:7B:BD"
 SERVICE_UUID = "0000fff1-0000-1000-8000-00805f9b34fb"
+MAX_IN_FLIGHT_WRITES = 3
 
 # I got a great connection and transition without any delay
 
 
+def build_wheel(steps=360):
+    """Build a color command for each hue step (full saturation and value)."""
+    if np is None:
+        return [
+            b"\x03" + bytes((int(r * 255), int(g * 255), int(b * 255)))
+            for r, g, b in (colorsys.hsv_to_rgb(i / steps, 1, 1) for i in range(steps))
+        ]
+
+    # Same sector math as colorsys.hsv_to_rgb, applied to all hues at once
+    hp = np.arange(steps) / steps * 6.0
+    sector = hp.astype(int) % 6
+    f = hp - hp.astype(int)
+    q = 1.0 - f
+    # colorsys rounds t this way too; keeps both tables byte-identical
+    t = 1.0 - q
+    one = np.ones(steps)
+    zero = np.zeros(steps)
+    conds = [sector == k for k in range(6)]
+    red = np.select(conds, [one, q, zero, zero, t, one])
+    green = np.select(conds, [t, one, one, q, zero, zero])
+    blue = np.select(conds, [zero, zero, t, one, one, q])
+    rgb = (np.stack((red, green, blue), axis=1) * 255).astype(np.uint8)
+    return [b"\x03" + row.tobytes() for row in rgb]
+
+
+# Precomputed color wheel: one ready-to-send color command per degree of hue
+WHEEL = build_wheel()
+
+
 async def mainOld(address):
     client = BleakClient(address)
     try:
@@ -17,21 +53,21 @@ async def mainOld(address):
         red = 255
         green = 0
         blue = 0
+        # Color command buffer reused across frames; only the RGB bytes change
+        buf = bytearray(b"\x03\x00\x00\x00")
         while True:
             for i in range(0, 255):
                 red -= 1
                 blue += 1
-                await client.write_gatt_char(
-                    SERVICE_UUID, b"\x03" + bytes([red, green, blue]), response=False
-                )
+                buf[1:4] = (red, green, blue)
+                await client.write_gatt_char(SERVICE_UUID, bytes(buf), response=False)
                 await asyncio.sleep(0.1)
             # then back
             for i in range(0, 255):
                 red += 1
                 blue -= 1
-                await client.write_gatt_char(
-                    SERVICE_UUID, b"\x03" + bytes([red, green, blue]), response=False
-                )
+                buf[1:4] = (red, green, blue)
+                await client.write_gatt_char(SERVICE_UUID, bytes(buf), response=False)
                 await asyncio.sleep(0.1)
             break  # remove this to loop forever
 
@@ -43,46 +79,63 @@ async def mainOld(address):
 
 async def main(address):
     client = BleakClient(address)
+    in_flight = asyncio.Semaphore(MAX_IN_FLIGHT_WRITES)
+    pending = set()
+    failure = None
     try:
         # measure time
         t0 = time.time()
         await client.connect()
         print("Connected in ", time.time() - t0, "s")
-        # Make a red green colors fade
-        red = 255
-        green = 0
-        blue = 0
+        # Writes are scheduled at a steady pace instead of waiting for each one to
+        # finish. A slot is taken before each write is scheduled, so at most
+        # MAX_IN_FLIGHT_WRITES are queued (BlueZ's queue can't overflow), the loop
+        # slows down when the link can't keep up, and frames go out in order.
+        async def write_frame(frame):
+            try:
+                await client.write_gatt_char(SERVICE_UUID, frame, response=False)
+            finally:
+                in_flight.release()
+
+        def on_write_done(task):
+            nonlocal failure
+            pending.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                failure = failure or task.exception()
+
+        async def schedule(frame):
+            # Stop at the first failed write instead of writing to a dead link
+            if failure is not None:
+                raise failure
+            await in_flight.acquire()
+            task = asyncio.create_task(write_frame(frame))
+            pending.add(task)
+            task.add_done_callback(on_write_done)
+
         while True:
             for i in range(0, 360):
-                hue = i / 360.0
-                r, g, b = colorsys.hsv_to_rgb(hue, 1, 1)
-                red = int(r * 255)
-                green = int(g * 255)
-                blue = int(b * 255)
-
-                await client.write_gatt_char(
-                    SERVICE_UUID, b"\x03" + bytes([red, green, blue]), response=False
-                )
+                await schedule(WHEEL[i])
                 await asyncio.sleep(0.01)
 
             # Create a smooth transition back
             for i in range(359, -1, -1):
-                hue = i / 360.0
-                r, g, b = colorsys.hsv_to_rgb(hue, 1, 1)
-                red = int(r * 255)
-                green = int(g * 255)
-                blue = int(b * 255)
-
-                await client.write_gatt_char(
-                    SERVICE_UUID, b"\x03" + bytes([red, green, blue]), response=False
-                )
+                await schedule(WHEEL[i])
                 await asyncio.sleep(0.01)
 
             break  # remove this to loop forever
 
+        await asyncio.gather(*pending)
+        if failure is not None:
+            raise failure
+
     except Exception as e:
         print(e)
     finally:
+        # Don't leave queued writes running against a disconnected client
+        leftover = list(pending)
+        for task in leftover:
+            task.cancel()
+        await asyncio.gather(*leftover, return_exceptions=True)
         await client.disconnect()
 
 
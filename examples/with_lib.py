@@ -17,6 +17,8 @@ address = "FF:FF:22:00:7B:BD"
 
 logging.basicConfig(level=logging.INFO)
 scanner = None
+# Built once and shared by every scanner instance
+_SCAN_FILTERS = {"UUIDs": [str(SERVICE_UUID)]}
 
 
 async def detection_callback(
@@ -40,7 +42,7 @@ async def detection_callback(
 
 async def main():
     global scanner
-    scanner = BleakScanner(filters={"UUIDs": [str(SERVICE_UUID)]})
+    scanner = BleakScanner(filters=_SCAN_FILTERS)
     scanner.register_detection_callback(detection_callback)
     await scanner.start()
 
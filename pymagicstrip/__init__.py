@@ -3,9 +3,10 @@
 from __future__ import annotations
 
 import asyncio
-from dataclasses import dataclass, replace
+from bisect import bisect_right
+from dataclasses import dataclass, fields
 import logging
-import re
+import random
 from typing import Any
 
 from bleak import BleakClient
@@ -28,16 +29,46 @@ _LOGGER.setLevel(logging.DEBUG)
 # handler.setFormatter(formatter)
 # _LOGGER.addHandler(handler)
 
+# Command payloads are converted to bytes once, rather than on every write.
+_EFFECT_CMDS = {name: bytes.fromhex(cmd) for name, cmd in EFFECTS.items()}
+_TOGGLE_POWER_CMD = bytes.fromhex(TOGGLE_POWER)
+_ACK_TRIGGER_CMD = bytes.fromhex("F0")
+_STATUS_QUERY_CMD = bytes.fromhex("0F")
+_CMD_ACK_BYTES = bytes.fromhex(CMD_ACK)
+_STATUS_HEADER = 0x0F
+_STATUS_LENGTH = 5
+_EFFECTS_LIST = tuple(EFFECTS)
+_HARDCODED_NAMES_LOWER = frozenset(name.lower() for name in const.HARDCODED_NAMES)
+
+# Lower bound (inclusive) of each RSSI rating after the first.
+_RSSI_BINS = (-85, -75, -55, 0)
+_RSSI_LABELS = ("Terrible", "Bad", "Good", "Excellent", "Unknown")
+
 
 def device_filter(device: BLEDevice, advertisement_data: AdvertisementData) -> bool:
     """Return True if device is a MagicStrip device."""
 
-    if device.name.lower() in [
-        d.lower() for d in const.HARDCODED_NAMES
-    ] and const.SERVICE_UUID in device.metadata.get("uuids", []):
-        return True
+    return (
+        device.name is not None
+        and device.name.lower() in _HARDCODED_NAMES_LOWER
+        and const.SERVICE_UUID in device.metadata.get("uuids", ())
+    )
+
 
-    return False
+def _find_status_frame(data: bytes | bytearray) -> int | None:
+    """Return offset of the first status frame in a notification, if any.
+
+    The device may send the ack and the status in a single notification, so the
+    frame isn't necessarily at the start.
+    """
+
+    start = data.find(_STATUS_HEADER)
+    while start != -1 and start + _STATUS_LENGTH <= len(data):
+        if data[start + 1] in (0x00, 0x01):
+            return start
+        start = data.find(_STATUS_HEADER, start + 1)
+
+    return None
 
 
 def _judge_rssi(rssi: int | None) -> str | None:
@@ -46,18 +77,7 @@ def _judge_rssi(rssi: int | None) -> str | None:
     if rssi is None:
         return None
 
-    if rssi >= 0:
-        return "Unknown"
-    if rssi >= -55:
-        return "Excellent"
-    if rssi >= -75:
-        return "Good"
-    if rssi >= -85:
-        return "Bad"
-    if rssi < -85:
-        return "Terrible"
-
-    return None
+    return _RSSI_LABELS[bisect_right(_RSSI_BINS, rssi)]
 
 
 @dataclass(frozen=True)
@@ -77,7 +97,20 @@ class MagicStripState:
         """Update state based on device notification."""
 
         # New object returned, since this is a dataclass.
-        return replace(self, on=on, brightness=brightness, **changes)
+        return self._replace(on=on, brightness=brightness, **changes)
+
+    def _replace(self, **changes: Any) -> MagicStripState:
+        """Return a copy with the given fields changed.
+
+        Cheaper than dataclasses.replace(), which re-runs __init__ over every field.
+        """
+
+        if unknown := changes.keys() - _STATE_FIELDS:
+            raise TypeError(f"Unknown MagicStripState fields: {sorted(unknown)}")
+
+        new = object.__new__(type(self))
+        new.__dict__.update(self.__dict__, **changes)
+        return new
 
     @property
     def connection_quality(self) -> str | None:
@@ -89,7 +122,10 @@ class MagicStripState:
     def effects_list(self) -> list[str]:
         """Get list of effects."""
 
-        return list(EFFECTS)
+        return list(_EFFECTS_LIST)
+
+
+_STATE_FIELDS = frozenset(field.name for field in fields(MagicStripState))
 
 
 class MagicStripDevice:
@@ -101,30 +137,76 @@ class MagicStripDevice:
         self.ble_device = device
         self.state = MagicStripState()
         self.lock = asyncio.Lock()
+        # Created in update(), so it binds to the running loop on Python 3.9.
+        self._status_event: asyncio.Event | None = None
         self._client = BleakClient(self.ble_device)
         self._client.set_disconnected_callback(self._on_disconnect)
         self._is_connected = False
-        self._retry_interval = 5  # Interval in seconds between retries
+        # Acked writes are only used if the device doesn't allow unacked ones.
+        self._write_response = False
+        self._retry_base = 0.1  # First delay in seconds between retries
+        self._retry_max = 5.0  # Longest delay in seconds between retries
+        self._max_connect_attempts = 10
 
     async def __aenter__(self) -> MagicStripDevice:
-        """Enter context, retrying connection until successful."""
+        """Enter context, connecting to the device if needed.
+
+        Failed connection attempts are retried with exponential backoff; after
+        _max_connect_attempts failures, BleConnectionError is raised.
+        """
+        attempt = 0
         while not self._is_connected:
             try:
                 _LOGGER.info("Attempting to connect to the device...")
                 await self._client.__aenter__()
+                # Every fresh link needs its own subscription, including
+                # reconnects after the link was dropped.
+                await self._start_notify()
                 self._is_connected = True
+                self._write_response = not self._supports_write_without_response()
                 _LOGGER.info("Device connected successfully.")
+                break
             except (asyncio.TimeoutError, asyncio.exceptions.TimeoutError) as exc:
-                _LOGGER.warning("Timeout on connect, retrying in %d seconds...", self._retry_interval)
-                await asyncio.sleep(self._retry_interval)
-            except asyncio.CancelledError as exc:
-                _LOGGER.warning("Connection cancelled, retrying in %d seconds...", self._retry_interval)
-                await asyncio.sleep(self._retry_interval)
+                _LOGGER.warning("Timeout on connect.")
+                last_exc: Exception = exc
             except BleakError as exc:
-                _LOGGER.warning("Error on connect: %s. Retrying in %d seconds...", exc, self._retry_interval)
-                await asyncio.sleep(self._retry_interval)
+                _LOGGER.warning("Error on connect: %s.", exc)
+                last_exc = exc
+
+            attempt += 1
+            if attempt >= self._max_connect_attempts:
+                raise BleConnectionError("Failed to connect") from last_exc
+
+            # Exponential backoff, with jitter so retries don't line up.
+            delay = min(
+                self._retry_max, self._retry_base * 2 ** (attempt - 1)
+            ) + random.uniform(0, 0.05)
+            _LOGGER.warning("Retrying in %.2f seconds...", delay)
+            await asyncio.sleep(delay)
         return self
 
+    async def _start_notify(self) -> None:
+        """Subscribe to status notifications on a freshly connected client.
+
+        The subscription is kept for the whole connection, so update() doesn't
+        need to subscribe and unsubscribe each time. On failure the link is
+        dropped, so the next connect attempt starts from a clean state.
+        """
+
+        try:
+            await self._client.start_notify(
+                CHARACTERISTIC_UUID, self._onoff_notification_handler
+            )
+        except (asyncio.TimeoutError, BleakError):
+            _LOGGER.debug("Failed to subscribe to notifications.", exc_info=True)
+            await self._client.disconnect()
+            raise
+
+    def _supports_write_without_response(self) -> bool:
+        """Return True if the command characteristic accepts unacked writes."""
+        char = self._client.services.get_characteristic(CHARACTERISTIC_UUID)
+        return char is not None and "write-without-response" in char.properties
+
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:  # type: ignore
         """Exit context."""
         pass  # avoid manual disconnect after each command
@@ -158,14 +240,9 @@ class MagicStripDevice:
         ZZ useless.
         """
 
-        status_components: re.Match | None
-        if (
-            status_components := re.search(
-                const.STATUS_REGEX, status_str := bytearray.hex(data)
-            )
-        ) is not None:
-            on = status_components.group(1) == "01"
-            brightness = int(status_components.group(2), 16)
+        if (start := _find_status_frame(data)) is not None:
+            on = data[start + 1] == 0x01
+            brightness = data[start + 2]
 
             self.state = self.state.replace_from_notification(
                 on=on, brightness=brightness
@@ -181,10 +258,13 @@ class MagicStripDevice:
 
             _LOGGER.debug("New state: %s", str(self.state))
 
-        elif status_str == CMD_ACK:
+            if self._status_event is not None:
+                self._status_event.set()
+
+        elif data == _CMD_ACK_BYTES:
             _LOGGER.debug("Got status ack.")
         else:
-            _LOGGER.debug("Invalid status message: %s", status_str)
+            _LOGGER.debug("Invalid status message: %s", bytearray.hex(data))
 
     @property
     def address(self) -> str:
@@ -194,26 +274,32 @@ class MagicStripDevice:
             return self.ble_device
         return str(self.ble_device.address)
 
-    async def _send_command(self, cmd: str | list, attempts: int = 1) -> None:
+    async def _send_command(
+        self, cmd: bytes | list[bytes], attempts: int = 1, send_ack: bool = False
+    ) -> None:
         """Send given command(s) to the BLE Strip device."""
 
-        if isinstance(cmd, list):
-            for cmd_single in cmd:
-                # recursive call with single elements of the commands list
-                await self._send_command(cmd_single)
-            return
+        cmds = cmd if isinstance(cmd, list) else [cmd]
+        retry = False
 
         # when "async with self" is used, the methods __aenter__ and __aexit__ are called (before and after respectively)
         async with self.lock:
             async with self:
                 try:
-                    _LOGGER.debug("Sending command: %s", cmd)
-                    await self._client.write_gatt_char(
-                        CHARACTERISTIC_UUID, bytes.fromhex(cmd)
-                    )
-                    await self._client.write_gatt_char(
-                        CHARACTERISTIC_UUID, bytes.fromhex("F0")
-                    )
+                    for cmd_single in cmds:
+                        _LOGGER.debug("Sending command: %s", cmd_single)
+                        await self._client.write_gatt_char(
+                            CHARACTERISTIC_UUID,
+                            cmd_single,
+                            response=self._write_response,
+                        )
+                    if send_ack:
+                        # Device answers F0 with a generic ack notification.
+                        await self._client.write_gatt_char(
+                            CHARACTERISTIC_UUID,
+                            _ACK_TRIGGER_CMD,
+                            response=self._write_response,
+                        )
                 except asyncio.TimeoutError as exc:
                     _LOGGER.debug("Timeout on write", exc_info=True)
                     raise BleTimeoutError from exc
@@ -226,10 +312,16 @@ class MagicStripDevice:
                         _LOGGER.debug(
                             "Assuming connection has been closed. Trying again..."
                         )
-                        self._send_command(cmd, attempts + 1)
+                        self._is_connected = False
+                        retry = True
                     else:
                         raise
 
+        # Retry outside the lock, since asyncio.Lock isn't reentrant.
+        if retry:
+            await self._send_command(cmd, attempts + 1, send_ack)
+            return
+
         _LOGGER.debug("Command sent.")
 
     async def set_color(self, red: int, green: int, blue: int) -> None:
@@ -248,11 +340,11 @@ class MagicStripDevice:
             if not 0 <= color <= 255:
                 raise OutOfRange
 
-        await self._send_command(f"03{''.join(f'{i:02x}' for i in (red, green, blue))}")
+        await self._send_command(bytes((0x03, red, green, blue)))
 
         # new state is set with just set color
-        self.state = replace(
-            self.state, color=(red, green, blue), effect_speed=None, effect=None
+        self.state = self.state._replace(
+            color=(red, green, blue), effect_speed=None, effect=None
         )
 
     async def set_brightness(self, brightness: int) -> None:
@@ -261,25 +353,25 @@ class MagicStripDevice:
         if not 0 <= brightness <= 255:
             raise OutOfRange
 
-        await self._send_command(f"08{''.join(f'{brightness:02x}')}")
+        await self._send_command(bytes((0x08, brightness)))
 
         # new state is set with just set brightness
-        self.state = replace(self.state, brightness=brightness)
+        self.state = self.state._replace(brightness=brightness)
 
         await self.update()
 
     async def set_effect_name(self, effect: str | None) -> None:
         """Set strip to specified effect."""
 
-        if effect not in list(EFFECTS) and effect is not None:
+        if effect is not None and effect not in EFFECTS:
             raise OutOfRange
 
         if effect is not None:
-            effect_cmd = EFFECTS[effect]
+            effect_cmd = _EFFECT_CMDS[effect]
             await self._send_command(effect_cmd)
 
         # new state is set with just set effect
-        self.state = replace(self.state, effect=effect, color=None)
+        self.state = self.state._replace(effect=effect, color=None)
 
     async def set_effect_speed(self, speed: int) -> None:
         """Set strip to specified effect."""
@@ -290,10 +382,10 @@ class MagicStripDevice:
         # Speed is inverted. 0 is fastest; 255 is slowest. Let's keep that to ourselves.
         inv_speed = 255 - speed
 
-        speed_cmd = f"09{inv_speed:02x}"
+        speed_cmd = bytes((0x09, inv_speed))
 
         # new state is set with just set effect speed
-        self.state = replace(self.state, effect_speed=speed)
+        self.state = self.state._replace(effect_speed=speed)
 
         await self._send_command(speed_cmd)
 
@@ -301,23 +393,24 @@ class MagicStripDevice:
 
     async def toggle_power(self) -> None:
         """Set strip to specified effect."""
-        await self._send_command(TOGGLE_POWER)
+        await self._send_command(_TOGGLE_POWER_CMD)
 
-        self.state = replace(self.state, on=not self.state.on)
+        self.state = self.state._replace(on=not self.state.on)
 
         await self.update()
 
     async def detection_callback(
         self, device: BLEDevice, advertisement_data: AdvertisementData
     ) -> None:
-        """Handle scanner data."""
+        """Handle scanner data.
+
+        Only the RSSI is refreshed here; call update() to query the device state.
+        """
 
-        self.state = replace(self.state, rssi=device.rssi)
+        self.state = self.state._replace(rssi=device.rssi)
 
         _LOGGER.debug("Discovered Device: %s", self.state)
 
-        await self.update()
-
     async def update(self) -> None:
         """Query device for current power and brightness states."""
 
@@ -326,23 +419,26 @@ class MagicStripDevice:
         async with self.lock:
             async with self:
                 try:
-                    await self._client.start_notify(
-                        CHARACTERISTIC_UUID, self._onoff_notification_handler
-                    )
+                    status_event = self._status_event = asyncio.Event()
 
                     await self._client.write_gatt_char(
-                        CHARACTERISTIC_UUID, bytes.fromhex("F0")
+                        CHARACTERISTIC_UUID,
+                        _ACK_TRIGGER_CMD,
+                        response=self._write_response,
                     )
                     await self._client.write_gatt_char(
-                        CHARACTERISTIC_UUID, bytes.fromhex("0F")
+                        CHARACTERISTIC_UUID,
+                        _STATUS_QUERY_CMD,
+                        response=self._write_response,
                     )
 
                     # await self._client.write_gatt_descriptor(4, bytes.fromhex("0100"))
 
                     # Give response notification time to come in.
-                    await asyncio.sleep(1)
-
-                    await self._client.stop_notify(CHARACTERISTIC_UUID)
+                    try:
+                        await asyncio.wait_for(status_event.wait(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        _LOGGER.debug("No status notification received.")
                 except asyncio.TimeoutError as exc:
                     _LOGGER.debug("Timeout on update", exc_info=True)
                     raise BleTimeoutError from exc